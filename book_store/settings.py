@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,7 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.ThresholdGZipMiddleware',
+    'store.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +94,14 @@ DATABASES = {
     }
 }
 
+# aliases from DATABASES that get the reads, e.g. ['replica_1']
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+
+# how long a user reads from the primary after a write
+REPLICA_PIN_SECONDS = 5
+
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.github.GithubOAuth2',
     'django.contrib.auth.backends.ModelBackend',
@@ -144,9 +156,64 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PARSER_CLASSES': (
         'rest_framework.parsers.JSONParser',
-    )
+    ),
+    # token bucket refill rates of store.throttling, per view scope
+    'DEFAULT_THROTTLE_RATES': {
+        'books_user': '30/min',
+        'books_ip': '120/min',
+        'relations_user': '60/min',
+        'relations_ip': '240/min',
+    }
+}
+
+# how many requests a client may fire at once before the rate applies.
+# The buckets live in the default cache: with locmem they are per worker
+# process, so a client gets up to workers x these limits; point CACHES at
+# a shared memcached or redis to make the limits global.
+THROTTLE_BURSTS = {
+    'books_user': 10,
+    'books_ip': 60,
+    'relations_user': 20,
+    'relations_ip': 100,
 }
 
+# MessagePack is optional, clients ask for it with
+# "Accept: application/msgpack" or "?format=msgpack"
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += (
+        'store.renderers.MessagePackRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] += (
+        'store.renderers.MessagePackParser',
+    )
+
+# deleted books are reported to delta sync clients this long, older
+# clients get 410 and do a full sync; purge with "purge_tombstones"
+TOMBSTONE_RETENTION_DAYS = 30
+
+# updated_at is stamped before a transaction commits, so change windows
+# overlap by this much to pick up writes that commit late
+SYNC_OVERLAP_SECONDS = 5
+
+# sidebar facet counts may be this much behind the catalogue
+FACETS_CACHE_SECONDS = 60
+
+# the autocomplete index lives in every process, its size is bounded
+# and it picks up changes of other processes every few seconds
+AUTOCOMPLETE_MAX_ENTRIES = 2000000
+AUTOCOMPLETE_SYNC_SECONDS = 10
+
+# sampling profiler, dump captures with "manage.py profile_captures"
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_SLOW_SECONDS = 1.0
+PROFILING_INTERVAL = 0.005
+PROFILING_CAPTURE_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_CAPTURES = 200
+
+# smaller responses are not worth the cpu time of compressing them
+GZIP_MIN_LENGTH = 1024
+
 SOCIAL_AUTH_JSONFIELD_ENABLED = True
 
 SOCIAL_AUTH_GITHUB_KEY = 'd3f0f7e904b92af84594'
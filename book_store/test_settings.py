@@ -0,0 +1,20 @@
+"""
+Settings for running the tests on sqlite instead of postgres:
+
+    python manage.py test --settings=book_store.test_settings
+"""
+from book_store.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',  # noqa: F405
+    },
+    # stand-in for a read replica, in tests it reads the test db of
+    # default the way a replica reads replicated data
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',  # noqa: F405
+        'TEST': {'MIRROR': 'default'},
+    },
+}
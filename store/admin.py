@@ -2,15 +2,26 @@ from django.contrib import admin
 from django.contrib.admin import ModelAdmin
 
 from store.models import Book, UserBookRelation
+from store.paginators import EstimatedCountPaginator
 
 
-# from store.models import Book
-#
 @admin.register(Book)
 class BookAdmin(ModelAdmin):
-    pass
+    list_display = ('id', 'name', 'author_name', 'price', 'rating', 'owner')
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner',)
+    # case sensitive lookups, the case insensitive ones wrap the column in
+    # UPPER() and no index serves them
+    search_fields = ('name__startswith', 'author_name__startswith')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(UserBookRelation)
 class UserBookRelationAdmin(ModelAdmin):
-    pass
+    list_display = ('id', 'user', 'book', 'like', 'in_bookmarks', 'rate')
+    list_select_related = ('user', 'book')
+    autocomplete_fields = ('user', 'book')
+    search_fields = ('user__username__exact', 'book__name__startswith')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
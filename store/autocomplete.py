@@ -0,0 +1,154 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from store.logic import get_synced_at
+from store.models import Book, BookTombstone
+
+# longer keys do not make prefixes more selective, only the index bigger
+KEY_LENGTH = 50
+
+
+def normalize(text):
+    return text.strip().casefold()[:KEY_LENGTH]
+
+
+class PrefixIndex:
+    """Sorted array of book names and authors for prefix lookups.
+
+    Each book has up to two keys, its name and its author, both kept in
+    one sorted list next to a parallel list of book ids, so a lookup is
+    a binary search plus a short scan.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.keys = []
+        self.book_ids = []
+        self.titles = {}
+        self.book_keys = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, book_id, name, author_name):
+        keys = {normalize(name), normalize(author_name)} - {''}
+        # likes and rates bump updated_at, so sync sees many books whose
+        # keys are the same, and moving them costs O(n) each
+        if (self.book_keys.get(book_id) == keys and
+                self.titles.get(book_id) == name):
+            return
+        with self.lock:
+            self._remove(book_id)
+            if len(self.keys) + len(keys) > self.max_entries:
+                return
+            for key in keys:
+                position = bisect_left(self.keys, key)
+                self.keys.insert(position, key)
+                self.book_ids.insert(position, book_id)
+            self.titles[book_id] = name
+            self.book_keys[book_id] = keys
+
+    def remove(self, book_id):
+        with self.lock:
+            self._remove(book_id)
+
+    def _remove(self, book_id):
+        for key in self.book_keys.pop(book_id, ()):
+            position = bisect_left(self.keys, key)
+            while self.book_ids[position] != book_id:
+                position += 1
+            del self.keys[position]
+            del self.book_ids[position]
+        self.titles.pop(book_id, None)
+
+    def search(self, prefix, limit=10):
+        """Returns [(book_id, name)] of books starting with the prefix."""
+        prefix = normalize(prefix)
+        found = {}
+        with self.lock:
+            position = bisect_left(self.keys, prefix)
+            while (position < len(self.keys) and len(found) < limit and
+                   self.keys[position].startswith(prefix)):
+                book_id = self.book_ids[position]
+                found.setdefault(book_id, self.titles[book_id])
+                position += 1
+        return list(found.items())
+
+
+class BookIndex(PrefixIndex):
+    """PrefixIndex over the Book table that catches up with its changes."""
+
+    def __init__(self, max_entries, sync_seconds):
+        super().__init__(max_entries)
+        self.sync_seconds = sync_seconds
+        self.synced_at = None
+        self.checked_at = 0
+
+    def build(self):
+        self.synced_at = get_synced_at()
+        self.checked_at = time.monotonic()
+        books = Book.objects.order_by('-bayesian_rating').values_list(
+            'id', 'name', 'author_name')
+        entries = []
+        for book_id, name, author_name in books.iterator(chunk_size=10000):
+            keys = {normalize(name), normalize(author_name)} - {''}
+            if len(entries) + len(keys) > self.max_entries:
+                break
+            entries.extend((key, book_id) for key in keys)
+            self.titles[book_id] = name
+            self.book_keys[book_id] = keys
+        # one sort is much cheaper than inserting books one by one
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.book_ids = [book_id for _, book_id in entries]
+
+    def sync(self):
+        """Applies book changes made by other processes since last sync."""
+        if time.monotonic() - self.checked_at < self.sync_seconds:
+            return
+        # saves of other processes can commit after this query, the
+        # next sync looks back a while; adding a book again is a no-op
+        synced_at = get_synced_at()
+        self.checked_at = time.monotonic()
+        changed = Book.objects.filter(
+            updated_at__gte=self.synced_at).values_list(
+            'id', 'name', 'author_name')
+        for book_id, name, author_name in changed:
+            self.add(book_id, name, author_name)
+        for book_id in BookTombstone.objects.filter(
+                deleted_at__gte=self.synced_at).values_list('book_id',
+                                                            flat=True):
+            self.remove(book_id)
+        self.synced_at = synced_at
+
+
+book_index = None
+_build_lock = threading.Lock()
+
+
+def get_book_index():
+    """Returns the index of this process, building it on first use."""
+    global book_index
+    if book_index is None:
+        with _build_lock:
+            if book_index is None:
+                index = BookIndex(settings.AUTOCOMPLETE_MAX_ENTRIES,
+                                  settings.AUTOCOMPLETE_SYNC_SECONDS)
+                index.build()
+                book_index = index
+    book_index.sync()
+    return book_index
+
+
+def book_saved(book_id, name, author_name):
+    if book_index is not None:
+        book_index.add(book_id, name, author_name)
+
+
+def book_deleted(book_id):
+    if book_index is not None:
+        book_index.remove(book_id)
@@ -1,10 +1,134 @@
-from django.db.models import Avg
+from datetime import timedelta
+from decimal import Decimal
 
-from store.models import UserBookRelation
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, Max, Q, Value, When
+from django.utils import timezone
+
+from store.models import Book, BookTombstone, UserBookRelation
+
+RATE_FIELDS = [f'rate_{rate}_count'
+               for rate, _ in UserBookRelation.RATE_CHOICES]
+
+# lower bounds of the price facet buckets, the last one is open
+PRICE_BUCKETS = (0, 500, 1000, 1500, 2000)
 
 
 def set_rating(book):
-    rating = UserBookRelation.objects.filter(book=book).aggregate(
-        rating=Avg('rate')).get('rating')
-    book.rating = rating
-    book.save()
\ No newline at end of file
+    """Rebuilds the rating histogram of the book from scratch."""
+    counts = UserBookRelation.objects.filter(book=book).aggregate(**{
+        f'rate_{rate}_count': Count('id', filter=Q(rate=rate))
+        for rate, _ in UserBookRelation.RATE_CHOICES})
+    for field, count in counts.items():
+        setattr(book, field, count)
+    calculate_rating(book)
+    book.save()
+
+
+def update_rating(book, old_rate, new_rate):
+    """Moves one rate of the book histogram from old_rate to new_rate."""
+    with transaction.atomic():
+        # the row lock makes concurrent rates of the book wait for each
+        # other, so the derived columns always match the histogram
+        locked = Book.objects.select_for_update().only(*RATE_FIELDS).filter(
+            pk=book.pk).first()
+        if locked is None:
+            return
+        if old_rate:
+            field = f'rate_{old_rate}_count'
+            setattr(locked, field, getattr(locked, field) - 1)
+        if new_rate:
+            field = f'rate_{new_rate}_count'
+            setattr(locked, field, getattr(locked, field) + 1)
+        calculate_rating(locked)
+        changes = {field: getattr(locked, field)
+                   for field in RATE_FIELDS + ['rating', 'raters_count',
+                                               'bayesian_rating']}
+        Book.objects.filter(pk=book.pk).update(updated_at=timezone.now(),
+                                               **changes)
+    for field, value in changes.items():
+        setattr(book, field, value)
+
+
+def calculate_rating(book):
+    """Fills rating, raters_count and bayesian_rating from the histogram."""
+    histogram = book.rating_histogram
+    raters = sum(histogram.values())
+    total = sum(rate * count for rate, count in histogram.items())
+    book.raters_count = raters
+    book.rating = (Decimal(total) / raters).quantize(
+        Decimal('0.01')) if raters else None
+    book.bayesian_rating = (
+        (Book.BAYESIAN_PRIOR_MEAN * Book.BAYESIAN_PRIOR_WEIGHT + total) /
+        (Book.BAYESIAN_PRIOR_WEIGHT + raters)).quantize(Decimal('0.01'))
+
+
+def touch_book(book):
+    # update() skips auto_now, so the timestamp is set explicitly
+    Book.objects.filter(pk=book.pk).update(updated_at=timezone.now())
+
+
+def touch_user_books(user):
+    """Mark the books that show the user's names as changed."""
+    Book.objects.filter(Q(owner=user) | Q(readers=user)).update(
+        updated_at=timezone.now())
+
+
+def get_synced_at():
+    """Where the next window of changes should start.
+
+    Overlaps the current one, since a change can commit a while after
+    it is stamped; the changes in the overlap are sent again.
+    """
+    return timezone.now() - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+
+
+def get_tombstones_cutoff():
+    """Deletions before this time may be purged already."""
+    return timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+
+
+def purge_tombstones():
+    deleted, _ = BookTombstone.objects.filter(
+        deleted_at__lt=get_tombstones_cutoff()).delete()
+    return deleted
+
+
+def get_catalogue_changes():
+    """Times of the latest change and of the latest deletion of any book.
+
+    Either one is None when there are no books or no tombstones.
+    """
+    book_changed = Book.objects.aggregate(
+        last=Max('updated_at')).get('last')
+    book_deleted = BookTombstone.objects.aggregate(
+        last=Max('deleted_at')).get('last')
+    return book_changed, book_deleted
+
+
+def get_book_facets(queryset, top_authors=10):
+    """Counts books per price bucket and per author.
+
+    Two grouped queries whose results are small whatever the catalogue
+    size: one row per bucket and top_authors rows.
+    """
+    queryset = queryset.order_by()
+    bucket = Case(*[When(price__lt=edge, then=Value(index))
+                    for index, edge in enumerate(PRICE_BUCKETS[1:])],
+                  default=Value(len(PRICE_BUCKETS) - 1))
+    buckets = queryset.annotate(price_bucket=bucket).values(
+        'price_bucket').annotate(count=Count('id'))
+    authors = queryset.values('author_name').annotate(
+        count=Count('id')).order_by('-count', 'author_name')[:top_authors]
+
+    prices = [0] * len(PRICE_BUCKETS)
+    for row in buckets:
+        prices[row['price_bucket']] = row['count']
+    return {
+        'price': [{'min': low, 'max': high, 'count': count}
+                  for low, high, count in zip(PRICE_BUCKETS,
+                                              PRICE_BUCKETS[1:] + (None,),
+                                              prices)],
+        'authors': list(authors),
+    }
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import TOP_K, build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Precomputes "readers also liked" similarities between books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='only books with relations changed since '
+                                 'the previous build')
+        parser.add_argument('--top', type=int, default=TOP_K,
+                            help='similar books kept per book')
+
+    def handle(self, *args, **options):
+        count = build_recommendations(incremental=options['incremental'],
+                                      top_k=options['top'])
+        self.stdout.write(f'Similarities built for {count} books')
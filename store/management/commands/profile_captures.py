@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.profiling import CaptureStore
+
+
+class Command(BaseCommand):
+    help = ('Lists request profiles captured by ProfilingMiddleware or dumps '
+            'one of them as folded stacks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?',
+                            help='capture to dump, the latest with "last"')
+        parser.add_argument('--sql', action='store_true',
+                            help='dump the queries instead of the stacks')
+
+    def handle(self, *args, **options):
+        store = CaptureStore(settings.PROFILING_CAPTURE_DIR,
+                             settings.PROFILING_MAX_CAPTURES)
+        names = store.names()
+        name = options['name']
+        if name is None:
+            for name in names:
+                capture = store.load(name)
+                self.stdout.write(
+                    f"{name}  {capture['duration']:.3f}s  "
+                    f"{len(capture['queries'])} queries  "
+                    f"{capture['method']} {capture['path']}")
+            return
+
+        if name == 'last' and names:
+            name = names[-1]
+        if name not in names:
+            raise CommandError(f'No capture {name}')
+        capture = store.load(name)
+        if options['sql']:
+            for query in capture['queries']:
+                self.stdout.write(f"{query['time']:.6f}  {query['sql']}")
+        else:
+            # pipe into flamegraph.pl or load into speedscope
+            for line in capture['stacks']:
+                self.stdout.write(line)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store.logic import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = ('Deletes book tombstones older than TOMBSTONE_RETENTION_DAYS, '
+            'run it daily')
+
+    def handle(self, *args, **options):
+        count = purge_tombstones()
+        self.stdout.write(f'Purged {count} tombstones')
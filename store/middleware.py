@@ -0,0 +1,83 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from rest_framework.permissions import SAFE_METHODS
+
+from store.profiling import CaptureStore, RequestProfile, Sampler
+from store.routers import use_primary
+
+
+class ThresholdGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves responses below GZIP_MIN_LENGTH as is."""
+
+    def process_response(self, request, response):
+        min_length = getattr(settings, 'GZIP_MIN_LENGTH', 200)
+        if not response.streaming and len(response.content) < min_length:
+            return response
+        return super().process_response(request, response)
+
+
+class ReplicaPinningMiddleware:
+    """Reads from the primary db during and shortly after user writes.
+
+    Without it a user could get a stale replica answer right after a
+    write, e.g. the old likes count of a book they just liked.
+    """
+    cookie_name = 'pin_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writing = request.method not in SAFE_METHODS
+        token = use_primary.set(
+            writing or self.cookie_name in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        if writing:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax')
+        return response
+
+
+class ProfilingMiddleware:
+    """Profiles a fraction of requests and every slow one.
+
+    Captures go to PROFILING_CAPTURE_DIR, see the profile_captures command.
+    With PROFILING_ENABLED off the middleware removes itself.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sampler = Sampler(settings.PROFILING_INTERVAL,
+                               settings.PROFILING_SLOW_SECONDS)
+        self.store = CaptureStore(settings.PROFILING_CAPTURE_DIR,
+                                  settings.PROFILING_MAX_CAPTURES)
+
+    def __call__(self, request):
+        profile = RequestProfile(
+            request, random.random() < settings.PROFILING_SAMPLE_RATE)
+        self.sampler.add(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            self.sampler.remove(profile)
+        duration = time.monotonic() - profile.started
+        if profile.sampled or duration > settings.PROFILING_SLOW_SECONDS:
+            self.store.save(profile.as_dict(duration))
+        return response
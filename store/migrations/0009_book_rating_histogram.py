@@ -0,0 +1,78 @@
+# Generated by Django 4.2.2 on 2026-10-19 12:16
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+PRIOR_MEAN = Decimal('3.00')
+PRIOR_WEIGHT = 5
+
+
+def fill_rating_histogram(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    for book in Book.objects.iterator():
+        counts = UserBookRelation.objects.filter(book=book).aggregate(**{
+            f'rate_{rate}_count': Count('id', filter=Q(rate=rate))
+            for rate in range(1, 6)})
+        raters = sum(counts.values())
+        total = sum(rate * counts[f'rate_{rate}_count']
+                    for rate in range(1, 6))
+        Book.objects.filter(pk=book.pk).update(
+            raters_count=raters,
+            bayesian_rating=((PRIOR_MEAN * PRIOR_WEIGHT + total) /
+                             (PRIOR_WEIGHT + raters)).quantize(
+                Decimal('0.01')),
+            **counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_book_updated_at_userbookrelation_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='bayesian_rating',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=Decimal('3.00'), max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rate_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='raters_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='userbookrelation',
+            name='rate',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'terrible'), (2, 'bad'), (3, 'normal'), (4, 'good'), (5, 'excellent')], null=True),
+        ),
+        migrations.RunPython(fill_rating_histogram,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-19 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_book_similarity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='author_name',
+            field=models.CharField(db_index=True, default='', max_length=250),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='name',
+            field=models.CharField(db_index=True, max_length=250),
+        ),
+    ]
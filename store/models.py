@@ -1,21 +1,61 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 
 
 class Book(models.Model):
-    name = models.CharField(max_length=250)
+    # bayesian rating pulls books with few rates towards the prior mean
+    BAYESIAN_PRIOR_MEAN = Decimal('3.00')
+    BAYESIAN_PRIOR_WEIGHT = 5
+
+    # on postgres db_index adds a varchar_pattern_ops index too, which
+    # serves the prefix searches of the admin
+    name = models.CharField(max_length=250, db_index=True)
     price = models.DecimalField(max_digits=7, decimal_places=2)
-    author_name = models.CharField(max_length=250, default='')
+    author_name = models.CharField(max_length=250, default='', db_index=True)
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True,
                               related_name='my_books')
     readers = models.ManyToManyField(User, through='UserBookRelation',
                                      related_name='books')
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=None,
                                  null=True)
+    # rating histogram, kept up to date by UserBookRelation.save and
+    # store.signals
+    rate_1_count = models.PositiveIntegerField(default=0)
+    rate_2_count = models.PositiveIntegerField(default=0)
+    rate_3_count = models.PositiveIntegerField(default=0)
+    rate_4_count = models.PositiveIntegerField(default=0)
+    rate_5_count = models.PositiveIntegerField(default=0)
+    raters_count = models.PositiveIntegerField(default=0)
+    bayesian_rating = models.DecimalField(max_digits=3, decimal_places=2,
+                                          default=BAYESIAN_PRIOR_MEAN,
+                                          db_index=True)
+    # bumped on every change of the book itself or of its relations, so
+    # clients can ask only for books changed since their last sync
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f'id {self.id}: {self.name}'
 
+    @property
+    def rating_histogram(self):
+        return {rate: getattr(self, f'rate_{rate}_count')
+                for rate, _ in UserBookRelation.RATE_CHOICES}
+
+
+class BookTombstone(models.Model):
+    """Remembers deleted books for clients doing a delta sync.
+
+    Written by store.signals for every way a book can be deleted and
+    purged after TOMBSTONE_RETENTION_DAYS.
+    """
+    book_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'book {self.book_id} deleted at {self.deleted_at}'
+
 
 class UserBookRelation(models.Model):
     RATE_CHOICES = (
@@ -23,7 +63,7 @@ class UserBookRelation(models.Model):
         (2, 'bad'),
         (3, 'normal'),
         (4, 'good'),
-        (1, 'excellent')
+        (5, 'excellent')
     )
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -31,18 +71,63 @@ class UserBookRelation(models.Model):
     like = models.BooleanField(default=False)
     in_bookmarks = models.BooleanField(default=False)
     rate = models.PositiveSmallIntegerField(choices=RATE_CHOICES, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the rate as it is stored in the db, to know what save() changes
+        self.saved_rate = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'rate' in field_names:
+            instance.saved_rate = instance.rate
+        return instance
 
     def __str__(self):
         return f'{self.user.username}, {self.book.name}, Rate: {self.rate}'
 
     def save(self, *args, **kwargs):
-        from store.logic import set_rating
+        from store.logic import update_rating, touch_book
 
-        creating = not self.pk
-        old_rating = self.rate
+        with transaction.atomic():
+            # the stored rate, not saved_rate: a stale instance or a
+            # parallel save of the same relation would move a rate twice
+            old_rating = None
+            if self.pk is not None:
+                old_rating = UserBookRelation.objects.select_for_update(
+                    ).filter(pk=self.pk).values_list('rate', flat=True).first()
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
 
-        new_rating = self.rate
-        if old_rating != new_rating or creating:
-            set_rating(self.book)
+            new_rating = self.rate
+            self.saved_rate = new_rating
+            if old_rating != new_rating:
+                update_rating(self.book, old_rating, new_rating)
+            else:
+                # likes and bookmarks change the book aggregates as well
+                touch_book(self.book)
+
+
+class BookSimilarity(models.Model):
+    """Precomputed "readers also liked" pair, see build_recommendations."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE,
+                             related_name='similarities')
+    similar_book = models.ForeignKey(Book, on_delete=models.CASCADE,
+                                     related_name='similar_to')
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['book', '-score'])]
+
+    def __str__(self):
+        return f'{self.book_id} ~ {self.similar_book_id}: {self.score:.3f}'
+
+
+class RecommendationsBuild(models.Model):
+    started_at = models.DateTimeField()
+    books_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'build at {self.started_at}: {self.books_count} books'
@@ -0,0 +1,35 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# below this size an exact COUNT(*) is cheap enough
+ESTIMATE_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the postgres row estimate for huge tables.
+
+    Only unfiltered querysets are estimated, everything else is counted.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = self.estimate_count()
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+    def estimate_count(self):
+        """Planner estimate of the table size, None where there is none."""
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 for tables that were never analyzed
+        return int(row[0]) if row and row[0] >= 0 else None
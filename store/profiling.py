@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# a request running more queries than this is slow for that reason alone
+MAX_QUERIES = 1000
+
+
+class RequestProfile:
+    """Stacks and queries collected for one request."""
+
+    def __init__(self, request, sampled):
+        self.thread_id = threading.get_ident()
+        self.started = time.monotonic()
+        self.method = request.method
+        self.path = request.get_full_path()
+        self.sampled = sampled
+        self.stacks = Counter()
+        self.queries = []
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'sql': sql,
+                    'time': round(time.perf_counter() - start, 6),
+                })
+
+    def as_dict(self, duration):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'duration': round(duration, 6),
+            'sampled': self.sampled,
+            # "frame;frame;frame count", what flamegraph.pl and
+            # speedscope read
+            'stacks': [f'{stack} {count}'
+                       for stack, count in self.stacks.most_common()],
+            'queries': self.queries,
+        }
+
+
+def fold_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({code.co_filename}:'
+                     f'{code.co_firstlineno})'.replace(';', ','))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class Sampler:
+    """Background thread that samples the stacks of running requests.
+
+    Sampled requests are profiled from the start, the others only once
+    they run longer than slow_seconds. The thread sleeps while there are
+    no requests.
+    """
+
+    def __init__(self, interval, slow_seconds):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.busy = threading.Event()
+        self.thread = None
+
+    def add(self, profile):
+        with self.lock:
+            self.profiles[profile.thread_id] = profile
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True,
+                                               name='request-sampler')
+                self.thread.start()
+            self.busy.set()
+
+    def remove(self, profile):
+        with self.lock:
+            self.profiles.pop(profile.thread_id, None)
+            if not self.profiles:
+                self.busy.clear()
+
+    def run(self):
+        while True:
+            self.busy.wait()
+            time.sleep(self.interval)
+            now = time.monotonic()
+            frames = sys._current_frames()
+            # a whole pass holds the lock, so once remove() returns the
+            # request owns its stacks and nothing changes them anymore
+            with self.lock:
+                for profile in self.profiles.values():
+                    if (profile.sampled or
+                            now - profile.started > self.slow_seconds):
+                        frame = frames.get(profile.thread_id)
+                        if frame is not None:
+                            profile.stacks[fold_stack(frame)] += 1
+            del frames
+
+
+class CaptureStore:
+    """Ring buffer of profiles as json files, oldest ones are deleted."""
+
+    def __init__(self, directory, max_captures):
+        self.directory = Path(directory)
+        self.max_captures = max_captures
+
+    def names(self):
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob('*.json'))
+
+    def save(self, capture):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f'{time.time_ns()}-{threading.get_ident()}'
+        temporary = self.directory / f'{name}.tmp'
+        temporary.write_text(json.dumps(capture))
+        os.replace(temporary, self.directory / f'{name}.json')
+        for old_name in self.names()[:-self.max_captures]:
+            (self.directory / f'{old_name}.json').unlink(missing_ok=True)
+        return name
+
+    def load(self, name):
+        return json.loads((self.directory / f'{name}.json').read_text())
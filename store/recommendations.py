@@ -0,0 +1,166 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from store.models import (Book, BookSimilarity, RecommendationsBuild,
+                          UserBookRelation)
+
+TOP_K = 20
+CHUNK_SIZE = 10000
+
+
+def load_interactions(chunk_size=CHUNK_SIZE):
+    """Returns user ids, book ids and weights of all positive relations.
+
+    A like weighs 1 and a rate adds up to 1 more, rates below "normal"
+    count as nothing.
+    """
+    relations = UserBookRelation.objects.filter(
+        Q(like=True) | Q(rate__gte=3)).values_list(
+        'user_id', 'book_id', 'like', 'rate').order_by()
+    chunks = []
+    rows = []
+    for row in relations.iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) == chunk_size:
+            chunks.append(_to_array(rows))
+            rows = []
+    if rows or not chunks:
+        chunks.append(_to_array(rows))
+    data = np.concatenate(chunks)
+    weights = data[:, 2] + np.maximum(data[:, 3] - 2, 0) / 3
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), weights
+
+
+def _to_array(rows):
+    return np.array([(user, book, like, rate or 0)
+                     for user, book, like, rate in rows],
+                    dtype=np.float64).reshape(-1, 4)
+
+
+class SimilarityIndex:
+    """Item to item cosine similarity over the user x book matrix.
+
+    The matrix is kept sparse: interactions sorted once by user and once
+    by book, so a row of similarities only touches the readers of a book
+    and their other books.
+    """
+
+    def __init__(self, user_ids, book_ids, weights):
+        self.book_ids, book_idx = np.unique(book_ids, return_inverse=True)
+        _, user_idx = np.unique(user_ids, return_inverse=True)
+        self.weights = weights
+
+        self.by_user = np.argsort(user_idx, kind='stable')
+        self.user_ptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(user_idx))))
+        self.by_book = np.argsort(book_idx, kind='stable')
+        self.book_ptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(book_idx,
+                                        minlength=len(self.book_ids)))))
+        self.user_idx = user_idx
+        self.book_idx = book_idx
+        self.norms = np.sqrt(np.bincount(book_idx, weights=weights ** 2,
+                                         minlength=len(self.book_ids)))
+
+    def _position(self, book_id):
+        position = np.searchsorted(self.book_ids, book_id)
+        if (position == len(self.book_ids) or
+                self.book_ids[position] != book_id):
+            return None
+        return position
+
+    def _co_read(self, position):
+        """Every interaction of every reader of the book at position.
+
+        Returns their indexes and the weight the reader gave the book.
+        """
+        readers = self.by_book[
+            self.book_ptr[position]:self.book_ptr[position + 1]]
+        starts = self.user_ptr[self.user_idx[readers]]
+        ends = self.user_ptr[self.user_idx[readers] + 1]
+        lengths = ends - starts
+        offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths)
+        co_read = self.by_user[np.repeat(starts, lengths) + offsets]
+        return co_read, np.repeat(self.weights[readers], lengths)
+
+    def neighbours(self, book_id):
+        """Ids of the other books that share a reader with the book."""
+        position = self._position(book_id)
+        if position is None:
+            return set()
+        co_read, _ = self._co_read(position)
+        return set(self.book_ids[np.unique(self.book_idx[co_read])].tolist(
+        )) - {book_id}
+
+    def similar(self, book_id, top_k=TOP_K):
+        """Returns [(similar_book_id, score)] best first."""
+        position = self._position(book_id)
+        if position is None:
+            return []
+        co_read, reader_weights = self._co_read(position)
+        scores = np.bincount(
+            self.book_idx[co_read],
+            weights=self.weights[co_read] * reader_weights,
+            minlength=len(self.book_ids))
+        scores /= self.norms[position] * self.norms
+        scores[position] = 0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[
+                np.argpartition(-scores[candidates], top_k)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(self.book_ids[index]), float(scores[index]))
+                for index in candidates]
+
+
+def get_changed_books(index, since):
+    """Books whose similarity lists may differ from the ones built before.
+
+    Those are the books with relation changes (every relation write and
+    delete bumps Book.updated_at), the books they share readers with now,
+    and the books that listed them before, which covers deleted relations.
+    """
+    changed = set(Book.objects.filter(updated_at__gte=since).values_list(
+        'id', flat=True))
+    affected = set(changed)
+    for book_id in changed:
+        affected |= index.neighbours(book_id)
+    affected |= set(BookSimilarity.objects.filter(
+        similar_book_id__in=changed).values_list('book_id', flat=True))
+    return affected
+
+
+def build_recommendations(incremental=False, top_k=TOP_K):
+    """Recomputes BookSimilarity and returns the number of books done.
+
+    Incremental builds only refresh the books affected by relation
+    changes after the previous build started, see get_changed_books.
+    """
+    started_at = timezone.now()
+    index = SimilarityIndex(*load_interactions())
+
+    last_build = RecommendationsBuild.objects.order_by('-started_at').first()
+    if incremental and last_build:
+        book_ids = get_changed_books(index, last_build.started_at)
+    else:
+        book_ids = None
+
+    with transaction.atomic():
+        if book_ids is None:
+            BookSimilarity.objects.all().delete()
+            book_ids = index.book_ids.tolist()
+        else:
+            BookSimilarity.objects.filter(book_id__in=book_ids).delete()
+        BookSimilarity.objects.bulk_create((
+            BookSimilarity(book_id=book_id, similar_book_id=similar_id,
+                           score=score)
+            for book_id in book_ids
+            for similar_id, score in index.similar(book_id, top_k)),
+            batch_size=CHUNK_SIZE)
+        RecommendationsBuild.objects.create(started_at=started_at,
+                                            books_count=len(book_ids))
+    return len(book_ids)
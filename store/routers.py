@@ -0,0 +1,30 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# set by ReplicaPinningMiddleware for requests that must see fresh data
+use_primary = ContextVar('use_primary', default=False)
+
+
+class ReplicaRouter:
+    """Sends reads to DATABASE_REPLICAS and writes to the default db."""
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if (not replicas or use_primary.get() or
+                connections['default'].in_atomic_block):
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema by replication
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
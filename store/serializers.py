@@ -18,11 +18,41 @@ class BooksSerializer(ModelSerializer):
     owner_name = serializers.CharField(source='owner.username', default='',
                                        read_only=True)
     readers = BookReaderSerializer(many=True, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(),
+                                             read_only=True)
+    raters_count = serializers.IntegerField(read_only=True)
+    bayesian_rating = serializers.DecimalField(max_digits=3, decimal_places=2,
+                                               read_only=True)
+
+    # rating stats are only sent when the view asks for them in the context
+    # or they are listed in the "fields" of a sparse fieldset
+    rating_stats_fields = ['rating_histogram', 'raters_count',
+                           'bayesian_rating']
 
     class Meta:
         model = Book
         fields = ['id', 'name', 'price', 'author_name', 'annotated_likes',
-                  'rating', 'owner_name', 'readers']
+                  'rating', 'owner_name', 'readers', 'rating_histogram',
+                  'raters_count', 'bayesian_rating']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for param in ('fields', 'omit'):
+            unknown = set(self.context.get(param, [])) - set(fields)
+            if unknown:
+                raise serializers.ValidationError({param: [
+                    f"Unknown fields: {', '.join(sorted(unknown))}."]})
+        if self.context.get('fields'):
+            sent = set(self.context['fields'])
+        else:
+            sent = set(fields)
+            if not self.context.get('rating_stats'):
+                sent -= set(self.rating_stats_fields)
+        sent -= set(self.context.get('omit', []))
+        for field_name in list(fields):
+            if field_name not in sent:
+                fields.pop(field_name)
+        return fields
 
 
 class UserBooksRelationSerializer(ModelSerializer):
@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from store.autocomplete import book_deleted as remove_from_index
+from store.autocomplete import book_saved
+from store.logic import touch_book, touch_user_books, update_rating
+from store.models import Book, BookTombstone, UserBookRelation
+
+# the names the books show for their owner and readers
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def book_deleted(book_id):
+    BookTombstone.objects.create(book_id=book_id)
+    remove_from_index(book_id)
+
+
+@receiver(post_delete, sender=Book)
+def book_post_delete(sender, instance, using, **kwargs):
+    # post_delete is sent for queryset and cascade deletes too, unlike
+    # Book.delete(); on_commit keeps rolled back deletes out
+    book_id = instance.id
+    transaction.on_commit(lambda: book_deleted(book_id), using=using)
+
+
+@receiver(post_save, sender=Book)
+def book_post_save(sender, instance, using, **kwargs):
+    # the values are taken now, a rolled back save never reaches the index
+    args = (instance.id, instance.name, instance.author_name)
+    transaction.on_commit(lambda: book_saved(*args), using=using)
+
+
+@receiver(post_delete, sender=UserBookRelation)
+def relation_post_delete(sender, instance, origin, **kwargs):
+    # relations of a deleted book go with it, there is nothing to update
+    if isinstance(origin, Book) or (isinstance(origin, QuerySet) and
+                                    origin.model is Book):
+        return
+    # also reached when a user is deleted and the relations cascade
+    book = Book(pk=instance.book_id)
+    if instance.saved_rate:
+        update_rating(book, instance.saved_rate, None)
+    else:
+        touch_book(book)
+
+
+@receiver(pre_save, sender=User)
+def user_pre_save(sender, instance, update_fields, **kwargs):
+    # logins save last_login only, they should not mark every book changed
+    instance._book_names_changed = False
+    if instance.pk is None or (update_fields is not None and
+                               not set(USER_NAME_FIELDS) & update_fields):
+        return
+    saved = User.objects.filter(pk=instance.pk).values_list(
+        *USER_NAME_FIELDS).first()
+    instance._book_names_changed = saved is not None and saved != tuple(
+        getattr(instance, field) for field in USER_NAME_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def user_post_save(sender, instance, **kwargs):
+    if getattr(instance, '_book_names_changed', False):
+        touch_user_books(instance)
+
+
+@receiver(pre_delete, sender=User)
+def user_pre_delete(sender, instance, **kwargs):
+    # the owner is set to NULL with an update(), which skips auto_now
+    touch_user_books(instance)
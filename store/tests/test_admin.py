@@ -0,0 +1,74 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Book, UserBookRelation
+from store.paginators import EstimatedCountPaginator
+
+
+class UserBookRelationAdminTestCase(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin')
+        self.book = Book.objects.create(name='Alice', price=1000,
+                                        author_name='Author 1')
+        self.url = reverse('admin:store_userbookrelation_changelist')
+        self.client.force_login(self.admin)
+
+    def create_relations(self, count):
+        for i in range(count):
+            user = User.objects.create(username=f'user_{count}_{i}')
+            UserBookRelation.objects.create(user=user, book=self.book)
+
+    def test_changelist_queries(self):
+        self.create_relations(1)
+        with CaptureQueriesContext(connection) as one_row:
+            response = self.client.get(self.url)
+        self.assertEquals(200, response.status_code)
+
+        self.create_relations(10)
+        with CaptureQueriesContext(connection) as many_rows:
+            response = self.client.get(self.url)
+        self.assertEquals(200, response.status_code)
+        self.assertEquals(len(one_row), len(many_rows))
+
+    def test_search(self):
+        self.create_relations(2)
+        response = self.client.get(self.url, data={'q': 'user_2_1'})
+        self.assertEquals(1, response.context['cl'].result_count)
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+
+    def setUp(self):
+        Book.objects.create(name='Alice', price=1000, author_name='Author 1')
+
+    def test_small_table_exact_count(self):
+        paginator = EstimatedCountPaginator(Book.objects.order_by('id'), 10)
+        self.assertEquals(1, paginator.count)
+
+    @mock.patch.object(EstimatedCountPaginator, 'estimate_count',
+                       return_value=500000)
+    def test_huge_table_estimate(self, estimate_count):
+        paginator = EstimatedCountPaginator(Book.objects.order_by('id'), 10)
+        with self.assertNumQueries(0):
+            self.assertEquals(500000, paginator.count)
+
+    @mock.patch.object(EstimatedCountPaginator, 'estimate_count',
+                       return_value=500000)
+    def test_filtered_exact_count(self, estimate_count):
+        paginator = EstimatedCountPaginator(
+            Book.objects.filter(name='Alice').order_by('id'), 10)
+        self.assertEquals(1, paginator.count)
+        estimate_count.assert_not_called()
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs pg_class')
+    def test_postgres_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE store_book')
+        paginator = EstimatedCountPaginator(Book.objects.order_by('id'), 10)
+        self.assertEquals(1, paginator.estimate_count())
@@ -1,18 +1,24 @@
 import json
+from datetime import timedelta
+from unittest import mock
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db.models import Count, Case, When, Avg
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from store.models import Book, UserBookRelation
+from store.logic import get_book_facets
+from store.models import Book, BookSimilarity, UserBookRelation
 from store.serializers import BooksSerializer
 
 
 class BookApiTestCase(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.user_1 = User.objects.create(username='test_user')
         self.user_2 = User.objects.create(username='test_user2')
         self.user_3 = User.objects.create(username='test_user3', is_staff=True)
@@ -62,6 +68,46 @@ class BookApiTestCase(APITestCase):
         self.assertEquals(status.HTTP_200_OK, response.status_code)
         self.assertEquals(serializer_data, response.data)
 
+    def test_get_ordering_bayesian(self):
+        url = reverse('book-list')
+        UserBookRelation.objects.create(user=self.user_2, book=self.book_3,
+                                        rate=4)
+        response = self.client.get(url, data={'ordering': '-bayesian_rating',
+                                              'rating_stats': 'true'})
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals([self.book_1.id, self.book_3.id, self.book_2.id],
+                          [book['id'] for book in response.data])
+        self.assertEquals(1, response.data[0]['raters_count'])
+
+    def test_get_fields(self):
+        url = reverse('book-list')
+        # two for Last-Modified, one for the books without any joins
+        with self.assertNumQueries(3):
+            response = self.client.get(url, data={'fields': 'id,name,price',
+                                                  'ordering': 'price'})
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals({'id': self.book_1.id, 'name': 'Alice',
+                           'price': '1000.00'}, response.data[0])
+
+    def test_get_fields_unknown(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'fields': 'id,nope'})
+        self.assertEquals(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEquals({'fields': ['Unknown fields: nope.']},
+                          response.data)
+        response = self.client.get(url, data={'omit': 'nope'})
+        self.assertEquals(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_get_omit(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'omit': 'readers,owner_name',
+                                              'ordering': 'price'})
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals(['id', 'name', 'price', 'author_name',
+                           'annotated_likes', 'rating'],
+                          list(response.data[0]))
+        self.assertEquals(1, response.data[0]['annotated_likes'])
+
     def test_create(self):
         starting_count = Book.objects.all().count()
         url = reverse('book-list')
@@ -141,9 +187,271 @@ class BookApiTestCase(APITestCase):
         self.assertEquals(starting_count, ending_count + 1)
 
 
+class BookSyncTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='test_user')
+        self.book_1 = Book.objects.create(name='Alice', price=1000,
+                                          author_name='Author 1',
+                                          owner=self.user)
+        self.book_2 = Book.objects.create(name='War and Peace', price=1500,
+                                          author_name='Author 3')
+        self.url = reverse('book-list')
+
+    def test_last_modified(self):
+        Book.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        response = self.client.get(self.url)
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEquals(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_last_modified_current_second(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        self.assertIn('ETag', response)
+
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_etag_same_second(self):
+        second = timezone.now().replace(microsecond=0) - timedelta(minutes=1)
+        Book.objects.update(updated_at=second + timedelta(milliseconds=100))
+        response = self.client.get(self.url)
+        Book.objects.filter(id=self.book_2.id).update(
+            updated_at=second + timedelta(milliseconds=900))
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'],
+                                   HTTP_IF_MODIFIED_SINCE=response[
+                                       'Last-Modified'])
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+
+    def test_modified_after_like(self):
+        Book.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        last_modified = self.client.get(self.url)['Last-Modified']
+        relation = UserBookRelation.objects.create(user=self.user,
+                                                   book=self.book_1)
+        relation.like = True
+        relation.save()
+        response = self.client.get(self.url,
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+
+    def test_changed_since(self):
+        since = timezone.now()
+        Book.objects.filter(id=self.book_2.id).update(
+            updated_at=since - timedelta(minutes=1))
+        Book.objects.filter(id=self.book_1.id).update(
+            updated_at=since + timedelta(minutes=1))
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals([self.book_1.id],
+                          [book['id'] for book in response.data['changed']])
+        self.assertEquals([], response.data['deleted'])
+
+    def test_changed_since_deleted(self):
+        since = timezone.now()
+        book_id = self.book_2.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book_2.delete()
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals([book_id], response.data['deleted'])
+
+    def test_changed_since_queryset_deleted(self):
+        since = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.all().delete()
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals({self.book_1.id, self.book_2.id},
+                          set(response.data['deleted']))
+
+    def test_changed_since_owner_renamed(self):
+        since = timezone.now()
+        Book.objects.update(updated_at=since - timedelta(minutes=1))
+        self.user.username = 'renamed_user'
+        self.user.save()
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals([self.book_1.id],
+                          [book['id'] for book in response.data['changed']])
+        self.assertEquals('renamed_user',
+                          response.data['changed'][0]['owner_name'])
+
+    def test_changed_since_reader_renamed(self):
+        reader = User.objects.create(username='reader')
+        UserBookRelation.objects.create(user=reader, book=self.book_2)
+        since = timezone.now()
+        Book.objects.update(updated_at=since - timedelta(minutes=1))
+        reader.first_name = 'Leo'
+        reader.save(update_fields=['first_name'])
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals([self.book_2.id],
+                          [book['id'] for book in response.data['changed']])
+
+    def test_changed_since_owner_deleted(self):
+        since = timezone.now()
+        Book.objects.update(updated_at=since - timedelta(minutes=1))
+        self.user.delete()
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals([self.book_1.id],
+                          [book['id'] for book in response.data['changed']])
+        self.assertEquals('', response.data['changed'][0]['owner_name'])
+
+    def test_changed_since_login(self):
+        since = timezone.now()
+        Book.objects.update(updated_at=since - timedelta(minutes=1))
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.user.save()
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals([], response.data['changed'])
+
+    def test_changed_since_overlap(self):
+        since = timezone.now() - timedelta(minutes=1)
+        Book.objects.update(updated_at=since - timedelta(minutes=1))
+        synced_at = self.client.get(
+            self.url, data={'changed_since': since.isoformat()}).data[
+            'synced_at']
+        # stamped before the previous response, committed after it
+        Book.objects.filter(id=self.book_1.id).update(
+            updated_at=timezone.now() - timedelta(seconds=1))
+        response = self.client.get(
+            self.url, data={'changed_since': synced_at.isoformat()})
+        self.assertEquals([self.book_1.id],
+                          [book['id'] for book in response.data['changed']])
+
+    def test_changed_since_too_old(self):
+        since = timezone.now() - timedelta(days=365)
+        response = self.client.get(
+            self.url, data={'changed_since': since.isoformat()})
+        self.assertEquals(status.HTTP_410_GONE, response.status_code)
+
+    def test_changed_since_wrong(self):
+        response = self.client.get(self.url,
+                                   data={'changed_since': 'yesterday'})
+        self.assertEquals(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+class BookFacetsTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        Book.objects.create(name='Alice', price=100, author_name='Author 1')
+        Book.objects.create(name='War and Peace', price=1500,
+                            author_name='Author 3')
+        Book.objects.create(name='The life of Author 1', price=1200,
+                            author_name='Author 1')
+        Book.objects.create(name='Ruslan and Ludmila', price=2500,
+                            author_name='Author 2')
+        self.url = reverse('book-facets')
+
+    def test_facets(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals([1, 0, 1, 1, 1],
+                          [bucket['count'] for bucket in response.data[
+                              'price']])
+        self.assertEquals({'min': 2000, 'max': None, 'count': 1},
+                          response.data['price'][-1])
+        self.assertEquals({'author_name': 'Author 1', 'count': 2},
+                          response.data['authors'][0])
+
+    def test_facets_search(self):
+        response = self.client.get(self.url, data={'search': 'Author 1'})
+        self.assertEquals([{'author_name': 'Author 1', 'count': 2}],
+                          response.data['authors'])
+
+    def test_facets_cached(self):
+        self.client.get(self.url, data={'price': 100, 'search': 'Alice'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, data={'search': 'Alice',
+                                                        'price': 100})
+        self.assertEquals(1, sum(bucket['count'] for bucket in
+                                 response.data['price']))
+
+    def test_facets_cache_ignores_ordering(self):
+        self.client.get(self.url, data={'search': 'Alice'})
+        with self.assertNumQueries(0):
+            self.client.get(self.url, data={'search': 'Alice',
+                                            'ordering': 'price',
+                                            'format': 'json'})
+
+    def test_facets_top_authors(self):
+        with mock.patch('store.views.get_book_facets',
+                        wraps=lambda queryset: get_book_facets(
+                            queryset, top_authors=1)):
+            response = self.client.get(self.url)
+        self.assertEquals([{'author_name': 'Author 1', 'count': 2}],
+                          response.data['authors'])
+
+
+class BookRecommendationsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='test_user')
+        self.book_1 = Book.objects.create(name='Alice', price=1000,
+                                          author_name='Author 1')
+        self.book_2 = Book.objects.create(name='War and Peace', price=1500,
+                                          author_name='Author 3')
+        self.book_3 = Book.objects.create(name='The life of Author 1',
+                                          price=1200, author_name='Author 2')
+        BookSimilarity.objects.create(book=self.book_1,
+                                      similar_book=self.book_2, score=0.5)
+        BookSimilarity.objects.create(book=self.book_1,
+                                      similar_book=self.book_3, score=0.9)
+
+    def test_similar(self):
+        url = reverse('book-similar', args=(self.book_1.id,))
+        response = self.client.get(url)
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals([self.book_3.id, self.book_2.id],
+                          [book['id'] for book in response.data])
+
+    def test_similar_not_found(self):
+        url = reverse('book-similar', args=(self.book_3.id + 1,))
+        response = self.client.get(url)
+        self.assertEquals(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_similar_none(self):
+        url = reverse('book-similar', args=(self.book_2.id,))
+        response = self.client.get(url)
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals([], response.data)
+
+    def test_recommended(self):
+        UserBookRelation.objects.create(user=self.user, book=self.book_1,
+                                        like=True)
+        UserBookRelation.objects.create(user=self.user, book=self.book_3)
+        url = reverse('book-recommended')
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals([self.book_2.id],
+                          [book['id'] for book in response.data])
+
+    def test_recommended_anonymous(self):
+        url = reverse('book-recommended')
+        response = self.client.get(url)
+        self.assertEquals(status.HTTP_403_FORBIDDEN, response.status_code)
+
+
 class BookRelationTestCase(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create(username='test_user')
         self.user_2 = User.objects.create(username='test_user_2')
         self.book_1 = Book.objects.create(name='Alice', price=1000,
@@ -0,0 +1,138 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store import autocomplete
+from store.autocomplete import BookIndex, PrefixIndex
+from store.models import Book
+
+
+class PrefixIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex(max_entries=10)
+        self.index.add(1, 'Alice', 'Carroll')
+        self.index.add(2, 'War and Peace', 'Tolstoy')
+        self.index.add(3, 'Anna Karenina', 'Tolstoy')
+
+    def test_search(self):
+        self.assertEqual([(1, 'Alice'), (3, 'Anna Karenina')],
+                         self.index.search('a'))
+        self.assertEqual([(3, 'Anna Karenina'), (2, 'War and Peace')],
+                         self.index.search(' TOL'))
+        self.assertEqual([], self.index.search('x'))
+
+    def test_limit(self):
+        self.assertEqual([(1, 'Alice')], self.index.search('a', limit=1))
+
+    def test_update(self):
+        self.index.add(1, 'Through the Looking-Glass', 'Carroll')
+        self.assertEqual([], self.index.search('alice'))
+        self.assertEqual([(1, 'Through the Looking-Glass')],
+                         self.index.search('through'))
+        self.assertEqual(6, len(self.index))
+
+    def test_add_unchanged(self):
+        keys = list(self.index.keys)
+        with mock.patch.object(self.index, '_remove') as remove:
+            self.index.add(2, 'War and Peace', 'Tolstoy')
+        remove.assert_not_called()
+        self.assertEqual(keys, self.index.keys)
+
+    def test_remove(self):
+        self.index.remove(2)
+        self.assertEqual([(3, 'Anna Karenina')], self.index.search('tol'))
+        self.assertEqual(4, len(self.index))
+
+    def test_max_entries(self):
+        index = PrefixIndex(max_entries=3)
+        index.add(1, 'Alice', 'Carroll')
+        index.add(2, 'War and Peace', 'Tolstoy')
+        self.assertEqual([], index.search('war'))
+
+
+class BookIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.book_1 = Book.objects.create(name='Alice', price=1000,
+                                          author_name='Author 1')
+        self.book_2 = Book.objects.create(name='War and Peace', price=1500,
+                                          author_name='Author 3')
+        self.index = BookIndex(max_entries=100, sync_seconds=0)
+        self.index.build()
+
+    def test_build(self):
+        self.assertEqual([(self.book_1.id, 'Alice'),
+                          (self.book_2.id, 'War and Peace')],
+                         self.index.search('author'))
+
+    def test_sync(self):
+        # changes made by another process, so the index only sees the db
+        self.index.synced_at -= timedelta(seconds=1)
+        Book.objects.filter(id=self.book_1.id).update(name='Alice 2')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book_2.delete()
+        self.index.sync()
+        self.assertEqual([(self.book_1.id, 'Alice 2')],
+                         self.index.search('a'))
+
+
+    def test_sync_late_commit(self):
+        self.index.sync()
+        # stamped before that sync, committed by another process after it
+        Book.objects.filter(id=self.book_1.id).update(
+            name='Alice 2', updated_at=timezone.now() - timedelta(seconds=1))
+        self.index.sync()
+        self.assertEqual([(self.book_1.id, 'Alice 2')],
+                         self.index.search('alice'))
+
+@override_settings(AUTOCOMPLETE_SYNC_SECONDS=60)
+class AutocompleteApiTestCase(APITestCase):
+
+    def setUp(self):
+        autocomplete.book_index = None
+        self.book_1 = Book.objects.create(name='Alice', price=1000,
+                                          author_name='Author 1')
+        self.url = reverse('book-autocomplete')
+
+    def tearDown(self):
+        autocomplete.book_index = None
+
+    def test_get(self):
+        response = self.client.get(self.url, data={'q': 'al'})
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals([{'id': self.book_1.id, 'name': 'Alice'}],
+                          response.data)
+
+    def test_book_saved(self):
+        self.client.get(self.url, data={'q': 'al'})
+        with self.captureOnCommitCallbacks(execute=True):
+            book_2 = Book.objects.create(name='Alien', price=1000)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, data={'q': 'ali'})
+        self.assertEquals([self.book_1.id, book_2.id],
+                          [book['id'] for book in response.data])
+
+    def test_book_save_rolled_back(self):
+        self.client.get(self.url, data={'q': 'al'})
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Book.objects.create(name='Alien', price=1000)
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEquals([], callbacks)
+        response = self.client.get(self.url, data={'q': 'ali'})
+        self.assertEquals([self.book_1.id],
+                          [book['id'] for book in response.data])
+
+    def test_empty(self):
+        response = self.client.get(self.url)
+        self.assertEquals([], response.data)
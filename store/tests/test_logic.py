@@ -1,8 +1,12 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
 
-from store.logic import set_rating
-from store.models import Book, UserBookRelation
+from store.logic import purge_tombstones, set_rating
+from store.models import Book, BookTombstone, UserBookRelation
 
 
 class SetRatingTestCase(TestCase):
@@ -28,3 +32,103 @@ class SetRatingTestCase(TestCase):
         set_rating(self.book_1)
         self.book_1.refresh_from_db()
         self.assertEqual('4.67', str(self.book_1.rating))
+
+
+class UpdateRatingTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.book_1 = Book.objects.create(name='Test book 1', price=25,
+                                          author_name='Author 1')
+
+    def test_create(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1,
+                                        rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1,
+                                        rate=4)
+        self.book_1.refresh_from_db()
+        self.assertEqual({1: 0, 2: 0, 3: 0, 4: 1, 5: 1},
+                         self.book_1.rating_histogram)
+        self.assertEqual(2, self.book_1.raters_count)
+        self.assertEqual('4.50', str(self.book_1.rating))
+        # (3 * 5 + 9) / (5 + 2)
+        self.assertEqual('3.43', str(self.book_1.bayesian_rating))
+
+    def test_change_rate(self):
+        relation = UserBookRelation.objects.create(user=self.user1,
+                                                   book=self.book_1, rate=5)
+        relation = UserBookRelation.objects.get(id=relation.id)
+        relation.rate = 2
+        relation.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual({1: 0, 2: 1, 3: 0, 4: 0, 5: 0},
+                         self.book_1.rating_histogram)
+        self.assertEqual('2.00', str(self.book_1.rating))
+
+    def test_change_rate_stale(self):
+        relation = UserBookRelation.objects.create(user=self.user1,
+                                                   book=self.book_1, rate=3)
+        first = UserBookRelation.objects.get(id=relation.id)
+        second = UserBookRelation.objects.get(id=relation.id)
+        first.rate = 5
+        first.save()
+        second.rate = 4
+        second.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual({1: 0, 2: 0, 3: 0, 4: 1, 5: 0},
+                         self.book_1.rating_histogram)
+        self.assertEqual(1, self.book_1.raters_count)
+
+    def test_delete(self):
+        relation = UserBookRelation.objects.create(user=self.user1,
+                                                   book=self.book_1, rate=5)
+        relation.delete()
+        self.book_1.refresh_from_db()
+        self.assertEqual(0, self.book_1.raters_count)
+        self.assertEqual(None, self.book_1.rating)
+        self.assertEqual('3.00', str(self.book_1.bayesian_rating))
+
+    def test_user_deleted(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1,
+                                        rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1,
+                                        rate=3)
+        self.user1.delete()
+        self.book_1.refresh_from_db()
+        self.assertEqual({1: 0, 2: 0, 3: 1, 4: 0, 5: 0},
+                         self.book_1.rating_histogram)
+        self.assertEqual('3.00', str(self.book_1.rating))
+
+    def test_book_deleted(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1,
+                                        rate=5)
+        # the relations go with the book, its rating is not updated
+        with mock.patch('store.signals.update_rating') as update:
+            Book.objects.filter(id=self.book_1.id).delete()
+        update.assert_not_called()
+        self.assertFalse(UserBookRelation.objects.exists())
+
+    def test_set_rating_matches(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1,
+                                        rate=1)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1,
+                                        rate=4)
+        self.book_1.refresh_from_db()
+        incremental = (self.book_1.rating_histogram, self.book_1.rating,
+                       self.book_1.bayesian_rating)
+        set_rating(self.book_1)
+        self.book_1.refresh_from_db()
+        self.assertEqual(incremental, (self.book_1.rating_histogram,
+                                       self.book_1.rating,
+                                       self.book_1.bayesian_rating))
+
+
+class PurgeTombstonesTestCase(TestCase):
+    def test_purge(self):
+        old = BookTombstone.objects.create(book_id=1)
+        BookTombstone.objects.filter(id=old.id).update(
+            deleted_at=timezone.now() - timedelta(days=31))
+        recent = BookTombstone.objects.create(book_id=2)
+        self.assertEqual(1, purge_tombstones())
+        self.assertEqual([recent.id], list(
+            BookTombstone.objects.values_list('id', flat=True)))
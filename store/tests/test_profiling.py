@@ -0,0 +1,87 @@
+import time
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from store.middleware import ProfilingMiddleware
+from store.profiling import CaptureStore, RequestProfile, Sampler
+
+
+def slow_view(request):
+    User.objects.count()
+    time.sleep(0.05)
+    return HttpResponse()
+
+
+class ProfilingMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings = override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0,
+            PROFILING_SLOW_SECONDS=0.02, PROFILING_INTERVAL=0.001,
+            PROFILING_CAPTURE_DIR=directory.name, PROFILING_MAX_CAPTURES=2)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.store = CaptureStore(directory.name, 2)
+        self.request = RequestFactory().get('/book/')
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(slow_view)
+
+    def test_fast_request(self):
+        ProfilingMiddleware(lambda request: HttpResponse())(self.request)
+        self.assertEqual([], self.store.names())
+
+    def test_slow_request(self):
+        ProfilingMiddleware(slow_view)(self.request)
+        names = self.store.names()
+        self.assertEqual(1, len(names))
+        capture = self.store.load(names[0])
+        self.assertEqual('/book/', capture['path'])
+        self.assertGreater(capture['duration'], 0.05)
+        self.assertEqual(1, len(capture['queries']))
+        self.assertIn('slow_view', capture['stacks'][0])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request(self):
+        ProfilingMiddleware(lambda request: HttpResponse())(self.request)
+        self.assertEqual(1, len(self.store.names()))
+
+    def test_ring_buffer(self):
+        middleware = ProfilingMiddleware(slow_view)
+        for _ in range(3):
+            middleware(self.request)
+        self.assertEqual(2, len(self.store.names()))
+
+    def test_command(self):
+        ProfilingMiddleware(slow_view)(self.request)
+        out = StringIO()
+        call_command('profile_captures', stdout=out)
+        self.assertIn('1 queries  GET /book/', out.getvalue())
+
+        out = StringIO()
+        call_command('profile_captures', 'last', '--sql', stdout=out)
+        self.assertIn('COUNT(*)', out.getvalue())
+
+
+class SamplerTestCase(TestCase):
+
+    def test_no_samples_after_remove(self):
+        sampler = Sampler(interval=0.0001, slow_seconds=1)
+        profile = RequestProfile(RequestFactory().get('/book/'), True)
+        sampler.add(profile)
+        time.sleep(0.02)
+        sampler.remove(profile)
+        stacks = dict(profile.stacks)
+        time.sleep(0.02)
+        self.assertTrue(stacks)
+        self.assertEqual(stacks, dict(profile.stacks))
@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from store.models import Book, BookSimilarity, UserBookRelation
+from store.recommendations import build_recommendations
+
+
+class BuildRecommendationsTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}')
+                      for i in range(3)]
+        self.books = [Book.objects.create(name=f'Book {i}', price=25)
+                      for i in range(4)]
+        likes = [(0, 0), (0, 1), (1, 0), (1, 1), (1, 2), (2, 2), (2, 3)]
+        for user, book in likes:
+            UserBookRelation.objects.create(user=self.users[user],
+                                            book=self.books[book], like=True)
+
+    def similar_ids(self, book):
+        return list(BookSimilarity.objects.filter(book=book).order_by(
+            '-score').values_list('similar_book_id', flat=True))
+
+    def test_build(self):
+        count = build_recommendations()
+        self.assertEqual(4, count)
+        book_0, book_1, book_2, book_3 = self.books
+        self.assertEqual([book_1.id, book_2.id], self.similar_ids(book_0))
+        similar = self.similar_ids(book_2)
+        self.assertEqual(book_3.id, similar[0])
+        self.assertEqual({book_0.id, book_1.id}, set(similar[1:]))
+        score = BookSimilarity.objects.get(book=book_0,
+                                           similar_book=book_1).score
+        self.assertAlmostEqual(1.0, score)
+
+    def test_top(self):
+        build_recommendations(top_k=1)
+        self.assertEqual([self.books[3].id], self.similar_ids(self.books[2]))
+
+    def test_incremental(self):
+        build_recommendations()
+        UserBookRelation.objects.create(user=self.users[2],
+                                        book=self.books[0], like=True)
+        count = build_recommendations(incremental=True)
+        # book 0 changed, all other books share a reader with it now
+        self.assertEqual(4, count)
+        self.assertIn(self.books[3].id, self.similar_ids(self.books[0]))
+        self.assertIn(self.books[0].id, self.similar_ids(self.books[3]))
+
+    def test_incremental_neighbour_scores(self):
+        build_recommendations()
+        book_0, book_1, book_2, book_3 = self.books
+        old_score = BookSimilarity.objects.get(
+            book=book_3, similar_book=book_2).score
+        UserBookRelation.objects.create(user=self.users[0], book=book_2,
+                                        like=True)
+        build_recommendations(incremental=True)
+        # book 3 has no new relation, but book 2 got one more reader
+        new_score = BookSimilarity.objects.get(
+            book=book_3, similar_book=book_2).score
+        self.assertLess(new_score, old_score)
+
+    def test_incremental_deleted_relation(self):
+        build_recommendations()
+        book_0, book_1, book_2, book_3 = self.books
+        self.assertIn(book_2.id, self.similar_ids(book_0))
+        UserBookRelation.objects.filter(user=self.users[1],
+                                        book=book_2).delete()
+        build_recommendations(incremental=True)
+        self.assertNotIn(book_2.id, self.similar_ids(book_0))
+
+    def test_incremental_nothing_changed(self):
+        build_recommendations()
+        self.assertEqual(0, build_recommendations(incremental=True))
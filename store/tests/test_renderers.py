@@ -0,0 +1,65 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.middleware import ThresholdGZipMiddleware
+from store.models import Book
+from store.renderers import msgpack
+
+
+@skipUnless(msgpack, 'msgpack is not installed')
+class MessagePackTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='test_user')
+        self.book = Book.objects.create(name='Alice', price=1000,
+                                        author_name='Author 1',
+                                        owner=self.user)
+
+    def test_get(self):
+        url = reverse('book-list')
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertEquals('application/msgpack', response['Content-Type'])
+        data = msgpack.unpackb(response.content)
+        self.assertEquals('Alice', data[0]['name'])
+        self.assertEquals('1000.00', data[0]['price'])
+
+    def test_create(self):
+        url = reverse('book-list')
+        data = {
+            'name': 'Black fire',
+            'price': 760,
+            'author_name': 'Jack Jacobson'
+        }
+        self.client.force_login(self.user)
+        response = self.client.post(url, data=msgpack.packb(data),
+                                    content_type='application/msgpack')
+        self.assertEquals(status.HTTP_201_CREATED, response.status_code)
+        self.assertEquals('Black fire', Book.objects.last().name)
+
+
+class ThresholdGZipTestCase(TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+
+    def get_response(self, content):
+        middleware = ThresholdGZipMiddleware(lambda request: HttpResponse(
+            content))
+        return middleware(self.request)
+
+    @override_settings(GZIP_MIN_LENGTH=1024)
+    def test_small(self):
+        response = self.get_response(b'a' * 1000)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(GZIP_MIN_LENGTH=1024)
+    def test_large(self):
+        response = self.get_response(b'a' * 2000)
+        self.assertEquals('gzip', response['Content-Encoding'])
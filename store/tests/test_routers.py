@@ -0,0 +1,104 @@
+import json
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from store.middleware import ReplicaPinningMiddleware
+from store.models import Book
+from store.routers import ReplicaRouter
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.read_db = None
+
+        def view(request):
+            self.read_db = self.router.db_for_read(Book)
+            return HttpResponse()
+
+        self.middleware = ReplicaPinningMiddleware(view)
+
+    def test_read(self):
+        self.assertEquals('replica', self.router.db_for_read(Book))
+
+    def test_write(self):
+        self.assertEquals('default', self.router.db_for_write(Book))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertEquals('default', self.router.db_for_read(Book))
+
+    def test_safe_request(self):
+        response = self.middleware(self.factory.get('/book/'))
+        self.assertEquals('replica', self.read_db)
+        self.assertNotIn('pin_primary', response.cookies)
+
+    def test_write_request_pins(self):
+        response = self.middleware(self.factory.patch('/book_relation/1/'))
+        self.assertEquals('default', self.read_db)
+        self.assertIn('pin_primary', response.cookies)
+        # the pin does not leak outside of the request
+        self.assertEquals('replica', self.router.db_for_read(Book))
+
+    def test_pinned_read(self):
+        request = self.factory.get('/book/')
+        request.COOKIES['pin_primary'] = '1'
+        self.middleware(request)
+        self.assertEquals('default', self.read_db)
+
+
+@skipUnless('replica' in settings.DATABASES,
+            'needs the replica alias of book_store.test_settings')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaReadsTestCase(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_user')
+        self.book = Book.objects.create(name='Alice', price=1000,
+                                        author_name='Author 1')
+        self.url = reverse('book-list')
+
+    def get_book(self, client):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = client.get(self.url)
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        return response.data[0], len(primary), len(replica)
+
+    def test_anonymous_reads_replica(self):
+        _, primary, replica = self.get_book(self.client)
+        self.assertEquals(0, primary)
+        self.assertGreater(replica, 0)
+
+    def test_reads_primary_after_like(self):
+        self.client.force_login(self.user)
+        url = reverse('userbookrelation-detail', args=(self.book.id,))
+        response = self.client.patch(url, data=json.dumps({'like': True}),
+                                     content_type='application/json')
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        self.assertIn('pin_primary', self.client.cookies)
+
+        book, primary, replica = self.get_book(self.client)
+        self.assertEquals(1, book['annotated_likes'])
+        self.assertGreater(primary, 0)
+        self.assertEquals(0, replica)
+
+    def test_no_migrations_on_replica(self):
+        router = ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'store'))
+        self.assertFalse(router.allow_migrate('replica', 'store'))
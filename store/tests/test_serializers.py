@@ -73,7 +73,7 @@ class BookSerializerTestCase(TestCase):
                 'price': '1200.00',
                 'author_name': 'Author 2',
                 'annotated_likes': 2,
-                'rating': '3.50',
+                'rating': '3.67',
                 'owner_name': '',
                 'readers': [
                     {
@@ -93,3 +93,14 @@ class BookSerializerTestCase(TestCase):
         ]
 
         self.assertEquals(expected_data, data)
+
+    def test_rating_stats(self):
+        UserBookRelation.objects.create(user=self.user_1, book=self.book_1,
+                                        rate=5)
+        self.book_1.refresh_from_db()
+        data = BooksSerializer(self.book_1,
+                               context={'rating_stats': True}).data
+        self.assertEquals({'1': 0, '2': 0, '3': 0, '4': 0, '5': 1},
+                          data['rating_histogram'])
+        self.assertEquals(1, data['raters_count'])
+        self.assertEquals('3.33', data['bayesian_rating'])
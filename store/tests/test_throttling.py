@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.models import Book
+from store.throttling import IPTokenBucketThrottle
+from store.views import UserBookRelationView
+
+RATES = {
+    'DEFAULT_THROTTLE_RATES': {
+        'books_user': '1/min',
+        'books_ip': '1/min',
+        'relations_user': '1/min',
+        'relations_ip': '1/min',
+    }
+}
+
+
+@override_settings(REST_FRAMEWORK=RATES)
+class ThrottlingTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_user')
+        self.user_2 = User.objects.create(username='test_user_2')
+        self.book_1 = Book.objects.create(name='Alice', price=1000,
+                                          author_name='Author 1',
+                                          owner=self.user)
+        self.url = reverse('userbookrelation-detail', args=(self.book_1.id,))
+        self.data = json.dumps({'like': True})
+
+    def patch(self):
+        return self.client.patch(self.url, data=self.data,
+                                 content_type='application/json')
+
+    @override_settings(THROTTLE_BURSTS={'relations_user': 2,
+                                        'relations_ip': 10})
+    def test_user_burst(self):
+        self.client.force_login(self.user)
+        self.assertEquals(status.HTTP_200_OK, self.patch().status_code)
+        self.assertEquals(status.HTTP_200_OK, self.patch().status_code)
+        response = self.patch()
+        self.assertEquals(status.HTTP_429_TOO_MANY_REQUESTS,
+                          response.status_code)
+        self.assertIn('Retry-After', response)
+
+        # the bucket is per user
+        self.client.force_login(self.user_2)
+        self.assertEquals(status.HTTP_200_OK, self.patch().status_code)
+
+    @override_settings(THROTTLE_BURSTS={'relations_user': 100,
+                                        'relations_ip': 3})
+    def test_abusive_ip_costs_no_queries(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as accepted:
+            for _ in range(3):
+                self.assertEquals(status.HTTP_200_OK,
+                                  self.patch().status_code)
+        with CaptureQueriesContext(connection) as rejected:
+            for _ in range(100):
+                self.assertEquals(status.HTTP_429_TOO_MANY_REQUESTS,
+                                  self.patch().status_code)
+        self.assertGreater(len(accepted), 0)
+        self.assertEquals(0, len(rejected))
+
+    @override_settings(THROTTLE_BURSTS={'books_user': 1, 'books_ip': 1})
+    def test_book_reads_not_throttled(self):
+        for _ in range(5):
+            response = self.client.get(reverse('book-list'))
+            self.assertEquals(status.HTTP_200_OK, response.status_code)
+
+    @override_settings(THROTTLE_BURSTS={'books_user': 1, 'books_ip': 10})
+    def test_book_writes(self):
+        url = reverse('book-detail', args=(self.book_1.id,))
+        self.client.force_login(self.user)
+        data = json.dumps({'price': 500})
+        response = self.client.patch(url, data=data,
+                                     content_type='application/json')
+        self.assertEquals(status.HTTP_200_OK, response.status_code)
+        response = self.client.patch(url, data=data,
+                                     content_type='application/json')
+        self.assertEquals(status.HTTP_429_TOO_MANY_REQUESTS,
+                          response.status_code)
+
+    def check_parallel(self, requests):
+        view = UserBookRelationView()
+        request = RequestFactory().patch(self.url)
+        barrier = threading.Barrier(requests)
+        allowed = []
+
+        get = LocMemCache.get
+
+        def slow_get(self, *args, **kwargs):
+            # a shared cache answers a network round trip later
+            value = get(self, *args, **kwargs)
+            time.sleep(0.01)
+            return value
+
+        def check():
+            barrier.wait()
+            allowed.append(IPTokenBucketThrottle().allow_request(request,
+                                                                 view))
+
+        threads = [threading.Thread(target=check) for _ in range(requests)]
+        with mock.patch.object(LocMemCache, 'get', slow_get):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return allowed
+
+    @override_settings(THROTTLE_BURSTS={'relations_ip': 5})
+    def test_parallel_requests(self):
+        self.assertEquals(5, sum(self.check_parallel(20)))
+
+    @override_settings(THROTTLE_BURSTS={'relations_ip': 5})
+    def test_parallel_requests_within_burst(self):
+        # e.g. users behind one NAT address
+        self.assertEquals([True] * 5, self.check_parallel(5))
+
+    def test_locked_bucket(self):
+        # another request of the same ip is stuck updating the bucket
+        cache.add('throttle_relations_ip_127.0.0.1_lock', 1)
+        self.client.force_login(self.user)
+        with mock.patch.object(IPTokenBucketThrottle, 'lock_wait', 0.01), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.patch()
+        self.assertEquals(status.HTTP_429_TOO_MANY_REQUESTS,
+                          response.status_code)
+        self.assertEquals(0, len(queries))
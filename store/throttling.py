@@ -0,0 +1,119 @@
+import time
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Token bucket per client, the state is one (tokens, time) pair.
+
+    The rate is taken from DEFAULT_THROTTLE_RATES by
+    "<view.throttle_scope>_<kind>", the burst from THROTTLE_BURSTS.
+    Unlike SimpleRateThrottle it keeps no request history, so a check costs
+    the same few cache calls whatever the rate.
+
+    A bucket is updated while holding a cache.add() lock on its key, and
+    add() is atomic in locmem, memcached and redis. Parallel requests on
+    one key are common, many users share a NAT address and an app can
+    like and bookmark at once, so a request that finds the bucket locked
+    polls for the lock for up to lock_wait seconds. It is rejected only
+    when the lock stays held longer. The limit applies per cache:
+    with the default locmem cache every worker process has its own
+    buckets, so a client gets up to workers x rate. Configure a shared
+    cache to make it global.
+    """
+    kind = None
+    # a lock left by a crashed worker expires after lock_timeout
+    lock_timeout = 1
+    lock_wait = 0.5
+    lock_poll = 0.001
+
+    def __init__(self):
+        # the scope is known only in allow_request, like ScopedRateThrottle
+        pass
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.scope = f'{scope}_{self.kind}'
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        num_requests, duration = self.parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES[self.scope])
+        per_second = num_requests / duration
+        burst = settings.THROTTLE_BURSTS.get(self.scope, num_requests)
+        lock_key = f'{self.key}_lock'
+        if not self.acquire(lock_key):
+            self.wait_time = self.lock_timeout
+            return False
+        try:
+            now = self.timer()
+            tokens, updated = self.cache.get(self.key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * per_second)
+            if tokens < 1:
+                self.wait_time = (1 - tokens) / per_second
+                return False
+            # a full bucket is the same as no state, so it may expire then
+            self.cache.set(self.key, (tokens - 1, now),
+                           int(burst / per_second) + 1)
+            return True
+        finally:
+            self.cache.delete(lock_key)
+
+    def acquire(self, lock_key):
+        deadline = time.monotonic() + self.lock_wait
+        while not self.cache.add(lock_key, 1, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.lock_poll)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope,
+                                    'ident': request.user.pk}
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope,
+                                    'ident': self.get_ident(request)}
+
+
+class WriteThrottleMixin:
+    """Throttles unsafe requests of a view by user and by ip.
+
+    The ip throttle runs before authentication, so a rejected request does
+    not cost a single query. The user throttle needs request.user and
+    runs after it as usual in DRF, but still before any work of the view.
+    """
+    throttle_classes = [UserTokenBucketThrottle]
+    ip_throttle_classes = [IPTokenBucketThrottle]
+
+    def initial(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            for throttle_class in self.ip_throttle_classes:
+                throttle = throttle_class()
+                if not throttle.allow_request(request, self):
+                    self.throttled(request, throttle.wait())
+        super().initial(request, *args, **kwargs)
+
+    def get_throttles(self):
+        if self.request.method in SAFE_METHODS:
+            return []
+        return super().get_throttles()
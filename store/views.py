@@ -1,34 +1,198 @@
-from django.db.models import Count, Case, When, Avg
+from hashlib import md5
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Case, When, Avg, Q, Sum, Prefetch
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import (http_date, parse_etags,
+                               parse_http_date_safe, quote_etag)
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.mixins import UpdateModelMixin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
-from store.models import Book, UserBookRelation
+from store.autocomplete import get_book_index
+from store.logic import (RATE_FIELDS, get_book_facets,
+                         get_catalogue_changes, get_synced_at,
+                         get_tombstones_cutoff)
+from store.models import (Book, BookSimilarity, BookTombstone,
+                          UserBookRelation)
 from store.permissions import IsOwnerOrStaffOrReadOnly
 from store.serializers import BooksSerializer, UserBooksRelationSerializer
+from store.throttling import WriteThrottleMixin
 
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.all().annotate(annotated_likes=Count(
-        Case(When(userbookrelation__like=True, then=1)))).select_related(
-        'owner').prefetch_related('readers')
+class BookViewSet(WriteThrottleMixin, ModelViewSet):
+    # the joins and annotations are added by get_queryset, only for the
+    # serializer fields that are actually sent
+    queryset = Book.objects.all()
     serializer_class = BooksSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     permission_classes = [IsOwnerOrStaffOrReadOnly]
     filterset_fields = ['price']
     search_fields = ['name', 'author_name']
-    ordering_fields = ['price', 'author_name']
+    ordering_fields = ['price', 'author_name', 'bayesian_rating']
+    throttle_scope = 'books'
+    # serializer fields that are not plain Book columns
+    field_columns = {
+        'owner_name': ['owner__username'],
+        'rating_histogram': RATE_FIELDS,
+        'annotated_likes': [],
+        'readers': [],
+    }
+
+    def get_queryset(self):
+        fields = self.get_serializer().fields
+        queryset = super().get_queryset()
+        if 'annotated_likes' in fields:
+            queryset = queryset.annotate(annotated_likes=Count(
+                Case(When(userbookrelation__like=True, then=1))))
+        if 'owner_name' in fields:
+            queryset = queryset.select_related('owner')
+        if 'readers' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'readers', queryset=User.objects.only('first_name',
+                                                      'last_name')))
+        if self.request.method in SAFE_METHODS:
+            columns = ['id']
+            for field_name in fields:
+                columns += self.field_columns.get(field_name, [field_name])
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        params = self.request.query_params
+        context['rating_stats'] = params.get('rating_stats') in ('1', 'true')
+        # sparse fieldsets, e.g. ?fields=id,name,price or ?omit=readers
+        if self.request.method in SAFE_METHODS:
+            for param in ('fields', 'omit'):
+                if params.get(param):
+                    context[param] = params[param].split(',')
+        return context
 
     def perform_create(self, serializer):
         serializer.validated_data['owner'] = self.request.user
         serializer.save()
 
+    @action(detail=False)
+    def autocomplete(self, request):
+        query = request.query_params.get('q', '')
+        if not query.strip():
+            return Response([])
+        books = get_book_index().search(query)
+        return Response([{'id': book_id, 'name': name}
+                         for book_id, name in books])
+
+    @action(detail=False)
+    def facets(self, request):
+        # only the filter and search params change the counts
+        names = set(self.filterset_fields) | {api_settings.SEARCH_PARAM}
+        params = sorted((name, value) for name in names
+                        for value in request.query_params.getlist(name))
+        key = 'book_facets:' + md5(repr(params).encode()).hexdigest()
+        facets = cache.get(key)
+        if facets is None:
+            facets = get_book_facets(
+                self.filter_queryset(Book.objects.all()))
+            cache.set(key, facets, settings.FACETS_CACHE_SECONDS)
+        return Response(facets)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        books = list(self.get_queryset().filter(
+            similar_to__book_id=pk).order_by('-similar_to__score'))
+        # only a book without similarities costs the extra query
+        if not books and not Book.objects.filter(pk=pk).exists():
+            raise NotFound
+        return Response(self.get_serializer(books, many=True).data)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def recommended(self, request):
+        liked = Q(book__userbookrelation__user=request.user) & (
+                Q(book__userbookrelation__like=True) |
+                Q(book__userbookrelation__rate__gte=4))
+        book_ids = list(BookSimilarity.objects.filter(liked).exclude(
+            similar_book__userbookrelation__user=request.user).values(
+            'similar_book').annotate(total=Sum('score')).order_by(
+            '-total').values_list('similar_book', flat=True)[:20])
+        books = sorted(self.get_queryset().filter(id__in=book_ids),
+                       key=lambda book: book_ids.index(book.id))
+        return Response(self.get_serializer(books, many=True).data)
+
+    def list(self, request, *args, **kwargs):
+        changes = [stamp for stamp in get_catalogue_changes() if stamp]
+        if not changes:
+            return self._list(request, *args, **kwargs)
+        last_modified = max(changes).timestamp()
+        # full precision, unlike the http date of Last-Modified
+        etag = quote_etag('-'.join(str(stamp.timestamp())
+                                   for stamp in changes))
+        if self._not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = self._list(request, *args, **kwargs)
+        response['ETag'] = etag
+        # http dates have one second precision, so the date is rounded up
+        # and only sent once that second is over: a change made later in
+        # the same second would not be newer than it
+        rounded_up = int(last_modified) + 1
+        if rounded_up <= timezone.now().timestamp():
+            response['Last-Modified'] = http_date(rounded_up)
+        return response
+
+    def _list(self, request, *args, **kwargs):
+        if 'changed_since' in request.query_params:
+            return self._delta_list(request)
+        return super().list(request, *args, **kwargs)
+
+    @staticmethod
+    def _not_modified(request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return etag in parse_etags(if_none_match)
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is not None and last_modified < since
+
+    def _delta_list(self, request):
+        since = parse_datetime(request.query_params['changed_since'])
+        if since is None:
+            raise ValidationError(
+                {'changed_since': 'Expected an ISO 8601 datetime.'})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        if since < get_tombstones_cutoff():
+            # deletions that old may be purged, a delta could miss them
+            return Response(
+                {'detail': 'changed_since is too old, do a full sync.'},
+                status=status.HTTP_410_GONE)
+        # taken before querying, the next window overlaps this one
+        synced_at = get_synced_at()
+        books = self.filter_queryset(self.get_queryset()).filter(
+            updated_at__gt=since)
+        deleted = BookTombstone.objects.filter(
+            deleted_at__gt=since).values_list('book_id', flat=True)
+        return Response({
+            'synced_at': synced_at,
+            'changed': self.get_serializer(books, many=True).data,
+            'deleted': list(deleted),
+        })
+
 
-class UserBookRelationView(UpdateModelMixin, GenericViewSet):
+class UserBookRelationView(WriteThrottleMixin, UpdateModelMixin,
+                           GenericViewSet):
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'relations'
     queryset = UserBookRelation.objects.all()
     serializer_class = UserBooksRelationSerializer
     # we use lookup to hide id in url